@@ -5,35 +5,194 @@ Scrapes all articles from a MediaWiki instance and saves clean content for LLM p
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import argparse
+import ijson
+import orjson
+import threading
 import time
 import mwparserfromhell
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 from tqdm import tqdm
 import os
 import sys
 
+# MediaWiki caps the number of titles accepted by a single query module call
+MAX_TITLES_PER_QUERY = 50
+
+# Page titles use underscores in place of spaces in wiki URLs
+_SPACE_TO_UNDER = str.maketrans({' ': '_'})
+
+# Parts of a prop=revisions response that are handed over as soon as they are parsed
+_STREAMED_PREFIXES = {
+    'continue': 'continue',
+    'query.normalized.item': 'normalized',
+    'query.redirects.item': 'redirects',
+    'query.pages.item': 'pages'
+}
+
+def _iter_response_items(stream):
+    """
+    Incrementally parse a MediaWiki query response from a file-like stream
+    
+    Yields:
+        (kind, value) for the continuation block and for each normalized title,
+        redirect and page, as soon as that object has been fully read
+    """
+    events = ijson.parse(stream, use_float=True)
+    for prefix, event, value in events:
+        kind = _STREAMED_PREFIXES.get(prefix)
+        if kind is None or event not in ('start_map', 'start_array'):
+            continue
+        
+        # Build just this object, leaving the rest of the response unparsed
+        builder = ijson.ObjectBuilder()
+        builder.event(event, value)
+        depth = 1
+        for _, event, value in events:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if not depth:
+                    break
+        
+        yield kind, builder.value
+
+def _load_scraped_pages(output_file):
+    """
+    Read back the pages already saved in a JSON Lines output file
+    
+    A partial or undecodable last line left behind by an interrupted run is
+    truncated so new pages can be appended cleanly. Bad lines anywhere else
+    are skipped with a warning and left in the file.
+    
+    Returns:
+        (titles, page_count, total_words) for the pages already on disk
+    """
+    titles = set()
+    page_count = 0
+    total_words = 0
+    
+    if not os.path.exists(output_file):
+        return titles, page_count, total_words
+    
+    offset = 0
+    bad_line = None  # (offset, line_number) of the last line that failed to decode
+    
+    with open(output_file, 'rb+') as f:
+        for line_number, line in enumerate(f, 1):
+            if bad_line is not None:
+                # More data follows it, so it wasn't cut off by an interrupted write
+                print(f"⚠️  Skipping invalid JSON on line {bad_line[1]} of {output_file}")
+                bad_line = None
+            
+            line_offset = offset
+            offset += len(line)
+            
+            try:
+                page = orjson.loads(line) if line.endswith(b'\n') else None
+            except orjson.JSONDecodeError:
+                page = None
+            
+            if page is None:
+                bad_line = (line_offset, line_number)
+                continue
+            
+            title = page.get('title') if isinstance(page, dict) else None
+            if not title:
+                print(f"⚠️  Skipping record without a title on line {line_number} of {output_file}")
+                continue
+            
+            titles.add(title)
+            page_count += 1
+            total_words += page.get('word_count', 0)
+        
+        if bad_line is not None:
+            f.truncate(bad_line[0])
+            print(f"⚠️  Dropped {offset - bad_line[0]} bytes of incomplete last line "
+                  f"(line {bad_line[1]}) from {output_file}")
+    
+    return titles, page_count, total_words
+
+class TokenBucket:
+    """Thread-safe rate limiter handing out one request slot every `interval` seconds"""
+    
+    def __init__(self, interval, capacity=1):
+        """
+        Args:
+            interval: Seconds between request slots (0 disables limiting)
+            capacity: Maximum number of slots that can build up while idle
+        """
+        self.interval = interval
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request slot is available, then take it"""
+        if self.interval <= 0:
+            return
+        
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait = (1 - self.tokens) * self.interval
+            
+            time.sleep(wait)
+
 class MediaWikiScraper:
-    def __init__(self, base_url, delay=1.5):
+    def __init__(self, base_url, delay=1.5, concurrency=8):
         """
         Initialize scraper
         
         Args:
             base_url: Base wiki URL (e.g., "https://wiki.theleague-ns.com")
-            delay: Delay between requests in seconds
+            delay: Minimum delay between requests in seconds, shared by all workers
+            concurrency: Maximum number of content requests in flight at once
         """
         self.base_url = base_url.rstrip('/')
         self.api_url = f"{self.base_url}/api.php"
         self.delay = delay
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(delay)
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'MediaWikiScraper/1.0 (Educational/Research Use)'
+            'User-Agent': 'MediaWikiScraper/1.0 (Educational/Research Use)',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
         })
         
+        # Keep connections warm between requests and retry transient failures
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=5,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=['GET', 'POST']
+            )
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
     def get_all_page_titles(self):
         """Get list of all page titles from the wiki"""
         print("Fetching all page titles...")
         all_titles = []
-        continue_token = None
+        cont = {}
         
         while True:
             params = {
@@ -41,16 +200,18 @@ class MediaWikiScraper:
                 'list': 'allpages',
                 'aplimit': 500,  # Max allowed
                 'format': 'json',
+                'formatversion': 2,
                 'apnamespace': 0  # Main namespace only (articles)
             }
             
-            if continue_token:
-                params['apcontinue'] = continue_token
+            # Pass the whole continuation block back as MediaWiki expects
+            params.update(cont)
                 
             try:
+                self.bucket.acquire()
                 response = self.session.get(self.api_url, params=params)
                 response.raise_for_status()
-                data = response.json()
+                data = orjson.loads(response.content)
                 
                 if 'query' in data and 'allpages' in data['query']:
                     pages = data['query']['allpages']
@@ -58,57 +219,97 @@ class MediaWikiScraper:
                     print(f"Collected {len(all_titles)} page titles...")
                     
                 # Check for continuation
-                if 'continue' in data and 'apcontinue' in data['continue']:
-                    continue_token = data['continue']['apcontinue']
-                else:
+                cont = data.get('continue', {})
+                if not cont:
                     break
                     
             except Exception as e:
                 print(f"Error fetching page titles: {e}")
                 break
-                
-            time.sleep(self.delay)
             
         print(f"Found {len(all_titles)} total pages")
         return all_titles
     
-    def get_page_content(self, title):
-        """Get the raw wikitext content for a specific page"""
-        params = {
-            'action': 'query',
-            'prop': 'revisions',
-            'titles': title,
-            'rvprop': 'content',
-            'format': 'json',
-            'rvslots': 'main'
-        }
+    def get_pages_content(self, titles_batch):
+        """
+        Get the raw wikitext content for a batch of pages in one request
         
-        try:
-            response = self.session.get(self.api_url, params=params)
-            response.raise_for_status()
-            data = response.json()
+        Args:
+            titles_batch: Up to MAX_TITLES_PER_QUERY page titles
+            
+        Yields:
+            (title, content) tuples, keyed by the title as requested
+        """
+        cont = {}
+        
+        # Large pages can push a response over the API's size limit, in which
+        # case the remaining revisions come back through continuation
+        while True:
+            data = {
+                'action': 'query',
+                'prop': 'revisions',
+                'titles': '|'.join(titles_batch),
+                'rvprop': 'content',
+                'rvslots': 'main',
+                'format': 'json',
+                'formatversion': 2
+            }
+            data.update(cont)
+            
+            cont = {}
+            normalized = {}
+            redirects = {}
+            requested = None
             
-            pages = data.get('query', {}).get('pages', {})
-            for page_id, page_data in pages.items():
-                if 'revisions' in page_data and page_data['revisions']:
-                    content = page_data['revisions'][0]['slots']['main']['*']
-                    return content
+            try:
+                self.bucket.acquire()
+                # Stream the response so each page's wikitext is handed over as
+                # soon as it is parsed instead of buffering the whole payload
+                with self.session.post(self.api_url, data=data, stream=True) as response:
+                    response.raise_for_status()
+                    response.raw.decode_content = True  # undo gzip/deflate
                     
-        except Exception as e:
-            print(f"Error fetching content for '{title}': {e}")
+                    for kind, value in _iter_response_items(response.raw):
+                        if kind == 'continue':
+                            cont = value
+                        elif kind == 'normalized':
+                            normalized[value['from']] = value['to']
+                        elif kind == 'redirects':
+                            redirects[value['from']] = value['to']
+                        else:
+                            # MediaWiki lists normalized titles and redirects before
+                            # pages, so the titles we asked for can be mapped once
+                            if requested is None:
+                                requested = {}
+                                for title in titles_batch:
+                                    resolved = normalized.get(title, title)
+                                    resolved = redirects.get(resolved, resolved)
+                                    requested.setdefault(resolved, []).append(title)
+                            
+                            if not value.get('revisions'):
+                                continue
+                            content = value['revisions'][0]['slots']['main']['content']
+                            for title in requested.get(value['title'], [value['title']]):
+                                yield title, content
+                                
+            except Exception as e:
+                print(f"Error fetching content for batch starting at '{titles_batch[0]}': {e}")
+                return
             
-        return None
+            if not cont:
+                break
     
-    def clean_wikitext(self, wikitext):
-        """Return raw wikitext with minimal processing"""
-        if not wikitext:
-            return ""
+    def scrape_all_content(self, output_file='wiki_content.jsonl', keep_raw=False):
+        """
+        Scrape all pages and stream them to a JSON Lines file (one page per line)
         
-        # Just return the raw content - let the LLM handle it
-        return wikitext.strip()
-    
-    def scrape_all_content(self, output_file='wiki_content.json'):
-        """Scrape all pages and save to JSON file"""
+        Pages already saved in output_file by an earlier run are skipped and
+        new pages are appended, so an interrupted scrape picks up where it stopped.
+        
+        Args:
+            output_file: Path of the JSON Lines file to write
+            keep_raw: Also store the unstripped wikitext as 'raw_content'
+        """
         # Get all page titles
         titles = self.get_all_page_titles()
         
@@ -119,79 +320,110 @@ class MediaWikiScraper:
         # Create output directory if needed
         os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
         
-        scraped_content = []
+        # Resume from whatever an earlier run already saved
+        done, page_count, total_words = _load_scraped_pages(output_file)
+        if done:
+            titles = [title for title in titles if title not in done]
+            print(f"Resuming: {page_count} pages already saved in {output_file}")
         
         print(f"\nScraping content from {len(titles)} pages...")
         
-        for i, title in enumerate(tqdm(titles, desc="Scraping pages")):
-            # Get raw content
-            raw_content = self.get_page_content(title)
-            
-            if raw_content:
-                # Clean the content
-                clean_content = self.clean_wikitext(raw_content)
-                
-                if clean_content.strip():  # Only save if there's actual content
-                    page_data = {
-                        'title': title,
-                        'url': f"{self.base_url}/wiki/{title.replace(' ', '_')}",
-                        'content': clean_content,
-                        'raw_content': raw_content,
-                        'word_count': len(clean_content.split())
-                    }
-                    scraped_content.append(page_data)
-            
-            # Save progress periodically
-            if (i + 1) % 100 == 0:
-                with open(f"{output_file}.tmp", 'w', encoding='utf-8') as f:
-                    json.dump(scraped_content, f, indent=2, ensure_ascii=False)
-                print(f"\nSaved progress: {len(scraped_content)} pages processed")
-            
-            time.sleep(self.delay)
+        title_iter = iter(titles)
+        batches = iter(lambda: list(islice(title_iter, MAX_TITLES_PER_QUERY)), [])
         
-        # Final save
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(scraped_content, f, indent=2, ensure_ascii=False)
+        def fetch_batch(batch):
+            return list(self.get_pages_content(batch))
         
-        # Clean up temp file
-        if os.path.exists(f"{output_file}.tmp"):
-            os.remove(f"{output_file}.tmp")
+        # requests releases the GIL while waiting on the network, so worker
+        # threads sharing the session's connection pool overlap their requests.
+        # The token bucket is taken at request start, so waiting for the next
+        # slot overlaps with other requests still in flight.
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        futures = {executor.submit(fetch_batch, batch): batch for batch in batches}
+        url_prefix = f"{self.base_url}/wiki/"
+        
+        try:
+            # Each page is appended as soon as it arrives, so whatever has been
+            # fetched is already on disk if the run is interrupted
+            with open(output_file, 'ab', buffering=1 << 20) as out, \
+                    tqdm(total=len(titles), desc="Scraping pages") as progress:
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    pages = future.result()
+                    
+                    for title, raw_content in pages:
+                        # Raw wikitext is kept as-is apart from surrounding
+                        # whitespace - let the LLM handle it
+                        content = raw_content.strip() if raw_content else ''
+                        if not content:  # Only save if there's actual content
+                            continue
+                        
+                        word_count = len(content.split())
+                        page_data = {
+                            'title': title,
+                            'url': url_prefix + title.translate(_SPACE_TO_UNDER),
+                            'content': content,
+                            'word_count': word_count
+                        }
+                        if keep_raw:
+                            page_data['raw_content'] = raw_content
+                        out.write(orjson.dumps(page_data))
+                        out.write(b'\n')
+                        page_count += 1
+                        total_words += word_count
+                    
+                    progress.update(len(batch))
+        finally:
+            # Don't wait on batches still queued if the run was interrupted
+            executor.shutdown(wait=False, cancel_futures=True)
         
         print(f"\nScraping complete!")
-        print(f"Scraped {len(scraped_content)} pages")
+        print(f"Scraped {page_count} pages")
         print(f"Content saved to: {output_file}")
         
         # Print some stats
-        total_words = sum(page['word_count'] for page in scraped_content)
         print(f"Total words: {total_words:,}")
-        print(f"Average words per page: {total_words // len(scraped_content) if scraped_content else 0}")
+        print(f"Average words per page: {total_words // page_count if page_count else 0}")
         
-        return scraped_content
+        return page_count
 
 def main():
+    parser = argparse.ArgumentParser(description="MediaWiki Content Scraper for RAG System")
+    parser.add_argument('--keep-raw', action='store_true',
+                        help="also store the unstripped wikitext of each page as 'raw_content'")
+    args = parser.parse_args()
+    
     # Configuration
     WIKI_URL = "https://wiki.theleague-ns.com"
-    OUTPUT_FILE = "league_wiki_content.json"
+    OUTPUT_FILE = "league_wiki_content.jsonl"
     REQUEST_DELAY = 1.5  # Be nice to their server
+    CONCURRENCY = 8  # Content requests in flight at once
     
     print("MediaWiki Content Scraper for RAG System")
     print(f"Target: {WIKI_URL}")
     print(f"Output: {OUTPUT_FILE}")
     print(f"Delay: {REQUEST_DELAY}s between requests")
+    print(f"Concurrency: {CONCURRENCY} requests")
     print("-" * 50)
     
+    # Wikitext parsing is far slower without mwparserfromhell's C tokenizer
+    if not mwparserfromhell.parser.use_c:
+        print("⚠️  mwparserfromhell C tokenizer unavailable, falling back to the pure-Python parser")
+        print("   Reinstall mwparserfromhell from a wheel or with a C compiler available")
+    
     # Create scraper and run
-    scraper = MediaWikiScraper(WIKI_URL, delay=REQUEST_DELAY)
+    scraper = MediaWikiScraper(WIKI_URL, delay=REQUEST_DELAY, concurrency=CONCURRENCY)
     
     try:
-        content = scraper.scrape_all_content(OUTPUT_FILE)
+        scraper.scrape_all_content(OUTPUT_FILE, keep_raw=args.keep_raw)
         print(f"\n✅ Successfully scraped wiki content!")
         print(f"📁 Data saved to: {OUTPUT_FILE}")
         print(f"📊 Ready for RAG processing")
         
     except KeyboardInterrupt:
         print(f"\n⚠️  Scraping interrupted by user")
-        print(f"Partial data may be saved in {OUTPUT_FILE}.tmp")
+        print(f"Pages scraped so far are saved in {OUTPUT_FILE}")
+        print(f"Run again to resume where it stopped")
         
     except Exception as e:
         print(f"\n❌ Error during scraping: {e}")
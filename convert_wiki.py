@@ -1,127 +1,314 @@
 #!/usr/bin/env python3
 """
-Convert scraped wiki JSON to individual documents for Open WebUI
-Splits the large JSON file into separate text files that Open WebUI can import
+Convert scraped wiki JSON Lines to individual documents for Open WebUI
+Splits the scraped .jsonl file (or a legacy .json list) into separate text files that Open WebUI can import
 """
 
-import json
+import ijson
+import orjson
 import os
-import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
 
+# Articles handed to each worker process per task, to amortize IPC overhead
+WRITE_CHUNKSIZE = 64
+
+# Write buffer sizes: documents are small, the archive is one long sequential write
+DOCUMENT_BUFFER_SIZE = 1 << 16
+ARCHIVE_BUFFER_SIZE = 1 << 20
+
+# Characters that are problematic in filenames, plus whitespace, all become underscores
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*\t\n\r\x0b\x0c '})
+
+# Names for the JSON value that opens a file, as reported by ijson's first event
+_JSON_VALUE_NAMES = {
+    'start_map': 'an object',
+    'string': 'a string',
+    'number': 'a number',
+    'boolean': 'a boolean',
+    'null': 'null'
+}
+
 def sanitize_filename(title):
     """Convert wiki page title to safe filename"""
-    # Remove or replace characters that are problematic in filenames
-    filename = re.sub(r'[<>:"/\\|?*]', '_', title)
-    filename = re.sub(r'\s+', '_', filename)  # Replace spaces with underscores
-    filename = filename.strip('._')  # Remove leading/trailing dots and underscores
+    # Replace unsafe characters, then remove leading/trailing dots and underscores
+    filename = title.translate(_SANITIZE_TABLE).strip('._')
     
     # Limit length to avoid filesystem issues
-    if len(filename) > 200:
-        filename = filename[:200]
+    return filename[:200]
+
+def read_jsonl_articles(jsonl_file):
+    """
+    Yield articles from a JSON Lines file one at a time
+    
+    Lines that fail to decode are reported and yielded as None, so the
+    conversion counts them as skipped.
+    """
+    with open(jsonl_file, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                print(f"Error: Invalid JSON on line {line_number} of {jsonl_file}: {e}")
+                yield None
+
+def read_json_articles(json_file):
+    """
+    Stream articles out of a JSON list file one at a time
+    
+    Raises:
+        ValueError: If the file does not hold a list of articles
+        ijson.JSONError: If the file is not valid JSON
+    """
+    with open(json_file, 'rb') as f:
+        # ijson picks the fastest available backend (yajl2_c when built)
+        events = ijson.parse(f, use_float=True)
+        
+        first = next(events)
+        if first[1] != 'start_array':
+            raise ValueError(f"Expected a list of articles, got {_JSON_VALUE_NAMES.get(first[1], first[1])}")
+        
+        yield from ijson.items(chain([first], events), 'item')
+
+def _render_document(article):
+    """
+    Build the document file for an article
+    
+    Returns:
+        (filename, document_content), or None if the article has no content
+    """
+    title = article.get('title', 'Untitled')
+    content = article.get('content', '')
+    url = article.get('url', '')
+    word_count = article.get('word_count', 0)
+    
+    # Skip articles with no content
+    if not content.strip():
+        return None
+    
+    # Create filename
+    filename = sanitize_filename(title) + '.txt'
+    
+    # Create document content with metadata
+    document_content = f"""TITLE: {title}
+URL: {url}
+WORD COUNT: {word_count}
+
+CONTENT:
+{content}
+"""
+    
+    return filename, document_content
+
+def _write_article(article, output_dir):
+    """
+    Write a single article to its own document file
+    
+    Returns:
+        (ok, title) where ok is False if the article was empty, unreadable or failed to write
+    """
+    # Lines that failed to decode arrive as None and were already reported
+    if article is None:
+        return False, None
+    
+    title = 'Untitled'
+    try:
+        title = article.get('title', 'Untitled')
+        document = _render_document(article)
+        if document is None:
+            return False, title
+        
+        filename, document_content = document
+        
+        # Write the document
+        with open(Path(output_dir) / filename, 'w', encoding='utf-8', buffering=DOCUMENT_BUFFER_SIZE) as f:
+            f.write(document_content)
+        
+        return True, title
+        
+    except Exception as e:
+        print(f"Error processing article '{title}': {e}")
+        return False, title
+
+def _write_documents(wiki_data, output_path):
+    """Write each article to its own file in output_path, yielding (ok, title) per article"""
+    # Articles are independent, so write them from a pool of processes. The
+    # stream is fed in windows so only a bounded number of articles is queued.
+    workers = os.cpu_count() or 1
+    write = partial(_write_article, output_dir=str(output_path))
     
-    return filename
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            window = list(islice(wiki_data, workers * WRITE_CHUNKSIZE * 4))
+            if not window:
+                break
+            
+            yield from executor.map(write, window, chunksize=WRITE_CHUNKSIZE)
+
+def _write_archive(wiki_data, archive_path):
+    """Write each article as an entry of a single ZIP archive, yielding (ok, title) per article"""
+    written = set()
+    
+    with open(archive_path, 'wb', buffering=ARCHIVE_BUFFER_SIZE) as f, \
+            zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED, compresslevel=3) as archive:
+        for article in wiki_data:
+            # Lines that failed to decode arrive as None and were already reported
+            if article is None:
+                yield False, None
+                continue
+            
+            title = 'Untitled'
+            try:
+                title = article.get('title', 'Untitled')
+                document = _render_document(article)
+                if document is None:
+                    yield False, title
+                    continue
+                
+                filename, document_content = document
+                
+                # Different titles can sanitize to the same filename. A ZIP would
+                # then hold two entries with one name, so number the later ones.
+                if filename in written:
+                    stem = filename[:-len('.txt')]
+                    suffix = 2
+                    while f"{stem}_{suffix}.txt" in written:
+                        suffix += 1
+                    filename = f"{stem}_{suffix}.txt"
+                written.add(filename)
+                
+                archive.writestr(filename, document_content)
+                yield True, title
+                
+            except Exception as e:
+                print(f"Error processing article '{title}': {e}")
+                yield False, title
 
-def convert_json_to_documents(json_file, output_dir="wiki_documents"):
+def _document_stats(output_path):
+    """Count the .txt documents in output_path and their total size in one directory pass"""
+    count = 0
+    total_size = 0
+    with os.scandir(output_path) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith('.txt'):
+                count += 1
+                total_size += entry.stat(follow_symlinks=False).st_size
+    return count, total_size
+
+def convert_json_to_documents(json_file, output_dir="wiki_documents", archive=False):
     """
     Convert JSON file to individual document files for Open WebUI
     
     Args:
-        json_file: Path to your league_wiki_content.json file
+        json_file: Path to your league_wiki_content.jsonl (or legacy .json) file
         output_dir: Directory to save individual document files
+        archive: Write all documents into a single {output_dir}.zip instead
     """
     
     print(f"Converting {json_file} to individual documents...")
     
-    # Create output directory
-    output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
-    
-    # Load the JSON data
-    try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            wiki_data = json.load(f)
-    except FileNotFoundError:
+    if not os.path.exists(json_file):
         print(f"Error: Could not find {json_file}")
         print("Make sure the wiki scraping is complete and the file exists.")
         return
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON in {json_file}: {e}")
-        return
     
-    if not isinstance(wiki_data, list):
-        print(f"Error: Expected a list of articles, got {type(wiki_data)}")
+    if os.path.getsize(json_file) == 0:
+        print(f"Error: {json_file} is empty")
+        print("Make sure the wiki scraping is complete and actually saved pages.")
         return
     
-    print(f"Found {len(wiki_data)} articles to convert")
+    # Stream the articles so only one is held in memory at a time
+    if json_file.endswith('.jsonl'):
+        wiki_data = read_jsonl_articles(json_file)
+    else:
+        wiki_data = read_json_articles(json_file)
+    print(f"Streaming articles from {json_file}")
+    
+    if archive:
+        # One sequential archive write instead of thousands of small files
+        output_path = Path(f"{output_dir}.zip")
+        results = _write_archive(wiki_data, output_path)
+    else:
+        # Create output directory
+        output_path = Path(output_dir)
+        output_path.mkdir(exist_ok=True)
+        results = _write_documents(wiki_data, output_path)
     
     converted_count = 0
     skipped_count = 0
     
-    for article in wiki_data:
-        try:
-            title = article.get('title', 'Untitled')
-            content = article.get('content', '')
-            url = article.get('url', '')
-            word_count = article.get('word_count', 0)
-            
-            # Skip articles with no content
-            if not content.strip():
+    # Articles are read lazily, so a malformed input file only surfaces here
+    try:
+        for ok, title in results:
+            if not ok:
                 skipped_count += 1
                 continue
             
-            # Create filename
-            filename = sanitize_filename(title) + '.txt'
-            file_path = output_path / filename
-            
-            # Create document content with metadata
-            document_content = f"""TITLE: {title}
-URL: {url}
-WORD COUNT: {word_count}
-
-CONTENT:
-{content}
-"""
-            
-            # Write the document
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(document_content)
-            
             converted_count += 1
             
             # Progress update every 500 files
             if converted_count % 500 == 0:
                 print(f"Converted {converted_count} documents...")
-                
-        except Exception as e:
-            print(f"Error processing article '{title}': {e}")
-            skipped_count += 1
-            continue
+    except ijson.JSONError as e:
+        print(f"Error: Invalid JSON in {json_file}: {e}")
+        return
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    
+    if archive:
+        total_size = output_path.stat().st_size
+    else:
+        _, total_size = _document_stats(output_path)
     
     print(f"\nConversion complete!")
     print(f"✅ Converted: {converted_count} documents")
     print(f"⚠️  Skipped: {skipped_count} documents (empty or errors)")
     print(f"📁 Documents saved to: {output_path.absolute()}")
-    print(f"📊 Total size: {sum(f.stat().st_size for f in output_path.glob('*.txt') if f.is_file()) / 1024 / 1024:.1f} MB")
+    print(f"📊 Total size: {total_size / 1024 / 1024:.1f} MB")
     
     return output_path
 
-def create_batch_upload_info(output_dir="wiki_documents"):
+def create_batch_upload_info(output_dir="wiki_documents", archive=False):
     """Create instructions for batch uploading to Open WebUI"""
-    output_path = Path(output_dir)
-    
-    if not output_path.exists():
-        print(f"Directory {output_dir} doesn't exist. Run conversion first.")
-        return
-    
-    txt_files = list(output_path.glob('*.txt'))
+    if archive:
+        output_path = Path(f"{output_dir}.zip")
+        
+        if not output_path.exists():
+            print(f"Archive {output_path} doesn't exist. Run conversion first.")
+            return
+        
+        with zipfile.ZipFile(output_path) as zf:
+            # Count each entry name once, as extracting the archive would
+            entries = {info.filename: info for info in zf.infolist() if info.filename.endswith('.txt')}
+        document_count = len(entries)
+        total_size = sum(info.file_size for info in entries.values())
+        upload_step = f"4. Extract {output_path.name}, then upload the documents in batches (select multiple .txt files)"
+        zip_step = f"1. Documents are already zipped in {output_path.name}"
+        info_file = Path(f"{output_dir}_UPLOAD_INSTRUCTIONS.txt")
+    else:
+        output_path = Path(output_dir)
+        
+        if not output_path.exists():
+            print(f"Directory {output_dir} doesn't exist. Run conversion first.")
+            return
+        
+        document_count, total_size = _document_stats(output_path)
+        upload_step = "4. Upload documents in batches (select multiple .txt files)"
+        zip_step = f"1. Zip all documents: zip -r wiki_docs.zip {output_dir}/"
+        info_file = output_path / "UPLOAD_INSTRUCTIONS.txt"
     
     info_content = f"""OPEN WEBUI UPLOAD INSTRUCTIONS
 ====================================
 
-Generated documents: {len(txt_files)} files
+Generated documents: {document_count} files
 Location: {output_path.absolute()}
-Total size: {sum(f.stat().st_size for f in txt_files) / 1024 / 1024:.1f} MB
+Total size: {total_size / 1024 / 1024:.1f} MB
 
 UPLOAD METHODS:
 
@@ -129,11 +316,11 @@ Method 1: Web Interface (Recommended for smaller batches)
 1. Open Open WebUI in browser (http://localhost:3000)
 2. Go to Admin Panel → Knowledge Base
 3. Create new collection: "League NS Wiki"
-4. Upload documents in batches (select multiple .txt files)
+{upload_step}
 5. Process and index
 
 Method 2: Bulk Upload (For all files)
-1. Zip all documents: zip -r wiki_docs.zip {output_dir}/
+{zip_step}
 2. Use Open WebUI's bulk import feature
 3. Or use API if available
 
@@ -157,7 +344,6 @@ Remember: You are answering about a fictional roleplay world, not the real world
 """
     
     # Save instructions
-    info_file = output_path / "UPLOAD_INSTRUCTIONS.txt"
     with open(info_file, 'w', encoding='utf-8') as f:
         f.write(info_content)
     
@@ -168,8 +354,9 @@ def main():
     """Main function to convert JSON and create upload instructions"""
     
     # Configuration
-    JSON_FILE = "league_wiki_content.json"  # Your scraped wiki JSON
+    JSON_FILE = "league_wiki_content.jsonl"  # Your scraped wiki JSON Lines
     OUTPUT_DIR = "wiki_documents"
+    ARCHIVE = False  # Write a single wiki_documents.zip instead of one .txt per article
     
     print("League NS Wiki → Open WebUI Converter")
     print("=" * 40)
@@ -182,11 +369,11 @@ def main():
         return
     
     # Convert JSON to documents
-    output_path = convert_json_to_documents(JSON_FILE, OUTPUT_DIR)
+    output_path = convert_json_to_documents(JSON_FILE, OUTPUT_DIR, archive=ARCHIVE)
     
     if output_path:
         # Create upload instructions
-        create_batch_upload_info(OUTPUT_DIR)
+        create_batch_upload_info(OUTPUT_DIR, archive=ARCHIVE)
         
         print(f"\n🎉 Ready for Open WebUI!")
         print(f"Next steps:")